@@ -2,3 +2,7 @@ __author__ = "Gordon Ball <gordon@chronitis.net>"
 __version__ = "0.4.3"
 
 from .ipyrmd import ipynb_to_rmd, rmd_to_ipynb, ipynb_to_spin, spin_to_ipynb
+from .ipyrmd import ipynb_to_formats
+from .ipyrmd import check_pair, check_tree, Mismatch, CheckError
+from .ipyrmd import read_rmd, read_spin
+from .index import get_index, extract_cell, replace_cell, parse_chunk_options
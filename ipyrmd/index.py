@@ -0,0 +1,339 @@
+"""
+Random access to the cells of large Rmd documents
+
+An index records the byte offsets of each chunk and markdown block of an Rmd
+file, numbered as the cells of the notebook rmd_to_ipynb would produce, along
+with the chunk options and knitr label of each chunk. With an index, a single
+cell can be extracted or replaced by seeking straight to it rather than
+parsing the whole document. Indexes are cached (in memory and optionally in a
+JSON file) and rebuilt whenever the mtime or size of the document changes.
+"""
+
+import collections
+import io
+import json
+import os
+
+from .ipyrmd import (re_yaml_delim, re_code_start, re_code_end, make_cell,
+                     maybe_join)
+
+ENCODING = "utf-8"
+
+# cell_type is "markdown" or "code"; start/end span the whole block including
+# the chunk delimiters, body_start/body_end only the cell source
+Chunk = collections.namedtuple("Chunk", ["cell_type", "start", "end",
+                                         "body_start", "body_end",
+                                         "options", "label"])
+
+# mtime is in ns; header is the (start, end) span of the YAML header or None;
+# labels maps each chunk label to the chunk's position in chunks
+RmdIndex = collections.namedtuple("RmdIndex", ["path", "mtime", "size",
+                                               "header", "chunks", "labels"])
+
+index_cache = {}
+
+
+def split_chunk_options(text):
+    """
+    Split a chunk option string on commas which are not inside brackets or
+    quotes, eg "a, b=c(1, 2)" -> ["a", "b=c(1, 2)"]
+    """
+    parts = []
+    depth = 0
+    quote = None
+    current = ""
+    for c in text:
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += c
+    parts.append(current)
+    return [p.strip() for p in parts]
+
+
+def parse_chunk_options(text):
+    """
+    Parse the options of a {r ...} chunk header (as stored in
+    Rmd_chunk_options) into (label, options). As in knitr, the label is
+    either the first option if it has no value, or the label= option.
+    Option values are kept as unevaluated R source text.
+    """
+    label = None
+    options = collections.OrderedDict()
+    if not text:
+        return label, options
+
+    for i, part in enumerate(split_chunk_options(text)):
+        name, eq, value = part.partition("=")
+        if eq:
+            options[name.strip()] = value.strip()
+        elif i == 0 and part:
+            label = part
+
+    if label is None and "label" in options:
+        label = options["label"].strip("'\"")
+
+    return label, options
+
+
+def chunk_labels(chunks):
+    return {c.label: i for i, c in enumerate(chunks) if c.label is not None}
+
+
+def build_index(infile):
+    """
+    Scan an Rmd file and return an RmdIndex of its cells. The scan follows
+    the same rules as read_rmd, so that chunks[N] corresponds to cell N of
+    the converted notebook.
+    """
+    with open(infile, "rb") as f:
+        stat = os.fstat(f.fileno())
+        rawlines = f.readlines()
+
+    lines = [l.decode(ENCODING) for l in rawlines]
+    offsets = [0]
+    for l in rawlines:
+        offsets.append(offsets[-1] + len(l))
+
+    header = None
+    skip = range(0)
+    delim_lines = [i for i, l in enumerate(lines) if re_yaml_delim.match(l)]
+    if len(delim_lines) >= 2 and delim_lines[1] - delim_lines[0] > 1:
+        header = (offsets[delim_lines[0]], offsets[delim_lines[1] + 1])
+        skip = range(delim_lines[0], delim_lines[1] + 1)
+
+    chunks = []
+    in_code = False
+    md_start = None
+    md_content = False
+
+    for i, l in enumerate(lines):
+        if i in skip:
+            continue
+        if not in_code:
+            match = re_code_start.match(l)
+            if match:
+                # only markdown blocks with non-whitespace content are cells
+                if md_content:
+                    chunks.append(Chunk("markdown", md_start, offsets[i],
+                                        md_start, offsets[i], None, None))
+                options = (match.group(1) or "").strip(" ,") or None
+                label, _ = parse_chunk_options(options)
+                code_start, body_start = offsets[i], offsets[i + 1]
+                in_code = True
+            else:
+                if md_start is None:
+                    md_start = offsets[i]
+                md_content = md_content or bool(l.strip())
+        elif re_code_end.match(l):
+            chunks.append(Chunk("code", code_start, offsets[i + 1],
+                                body_start, offsets[i], options, label))
+            in_code = False
+            md_start = None
+            md_content = False
+
+    # read_rmd keeps a trailing markdown block even if it is only whitespace
+    end = offsets[-1]
+    if in_code:
+        chunks.append(Chunk("code", code_start, end, body_start, end,
+                            options, label))
+    elif md_start is not None:
+        chunks.append(Chunk("markdown", md_start, end, md_start, end,
+                            None, None))
+
+    return RmdIndex(os.path.abspath(infile), stat.st_mtime_ns, stat.st_size,
+                    header, chunks, chunk_labels(chunks))
+
+
+def is_current(infile, index):
+    stat = os.stat(infile)
+    current = (os.path.abspath(infile), stat.st_mtime_ns, stat.st_size)
+    return (index.path, index.mtime, index.size) == current
+
+
+def save_index(index, cachefile):
+    data = index._asdict()
+    data["chunks"] = [list(c) for c in index.chunks]
+    with open(cachefile, "w") as f:
+        json.dump(data, f)
+
+
+def load_index(cachefile):
+    with open(cachefile) as f:
+        data = json.load(f)
+    data["chunks"] = [Chunk(*c) for c in data["chunks"]]
+    if data["header"] is not None:
+        data["header"] = tuple(data["header"])
+    return RmdIndex(**data)
+
+
+def get_index(infile, cachefile=None):
+    """
+    Return an index for infile, reusing a cached one (from memory, or from
+    cachefile if given) if the file's mtime and size have not changed.
+    A rebuilt index is written back to cachefile.
+    """
+    path = os.path.abspath(infile)
+    index = index_cache.get(path, None)
+
+    if index is None and cachefile is not None and os.path.exists(cachefile):
+        try:
+            index = load_index(cachefile)
+        except (ValueError, KeyError, TypeError) as e:
+            print("Error reading index cache {0}: {1}".format(cachefile, e))
+
+    if index is None or not is_current(infile, index):
+        index = build_index(infile)
+        if cachefile is not None:
+            save_index(index, cachefile)
+
+    index_cache[path] = index
+    return index
+
+
+def find_chunk(index, key):
+    """
+    Look up a chunk by cell number or by label, returning (number, chunk)
+    """
+    if isinstance(key, str):
+        if key not in index.labels:
+            raise KeyError('No chunk labelled "{0}"'.format(key))
+        key = index.labels[key]
+    return key, index.chunks[key]
+
+
+def checked_index(infile, index):
+    if index is None:
+        return get_index(infile)
+    if not is_current(infile, index):
+        raise ValueError('Index for "{0}" is out of date'.format(infile))
+    return index
+
+
+def extract_cell(infile, key, index=None):
+    """
+    Read a single cell (by number or chunk label) from an Rmd file, returning
+    the same notebook cell rmd_to_ipynb would produce for it.
+    """
+    index = checked_index(infile, index)
+    _, chunk = find_chunk(index, key)
+
+    with open(infile, "rb") as f:
+        f.seek(chunk.body_start)
+        data = f.read(chunk.body_end - chunk.body_start)
+
+    # a YAML header is dropped from the block containing it, as in read_rmd
+    if index.header is not None and \
+            chunk.body_start <= index.header[0] < chunk.body_end:
+        header_start = index.header[0] - chunk.body_start
+        header_end = index.header[1] - chunk.body_start
+        data = data[:header_start] + data[header_end:]
+
+    lines = [l.decode(ENCODING) for l in io.BytesIO(data).readlines()]
+
+    if chunk.cell_type == "markdown":
+        return make_cell(False, [l.rstrip() + "\n" for l in lines])
+
+    # code cell source does not include the final newline
+    source = [l.rstrip() + "\n" for l in lines]
+    if source:
+        source[-1] = source[-1].rstrip("\n")
+    meta = {}
+    if chunk.options:
+        meta["Rmd_chunk_options"] = chunk.options
+    return make_cell(True, source, **meta)
+
+
+def replace_cell(infile, key, source, options=None, index=None):
+    """
+    Replace the source of a single cell (by number or chunk label) in an Rmd
+    file in place. For code cells, options replaces the chunk options if
+    given ("" to remove them). Returns the updated index, which is adjusted
+    rather than rebuilt unless the edit could move the YAML header.
+    """
+    index = checked_index(infile, index)
+    n, chunk = find_chunk(index, key)
+
+    text = maybe_join(source)
+    if text and not text.endswith("\n"):
+        text += "\n"
+    lines = text.splitlines()
+
+    if chunk.cell_type == "markdown":
+        if not text.strip():
+            raise ValueError("Markdown cell source cannot be empty")
+        if any(re_code_start.match(l) for l in lines):
+            raise ValueError("Markdown cell source cannot contain code chunks")
+    elif any(re_code_end.match(l) for l in lines):
+        raise ValueError("Code cell source cannot contain chunk delimiters")
+    if index.header is not None and \
+            chunk.body_start <= index.header[0] < chunk.body_end:
+        raise ValueError("Cannot replace the cell containing the header")
+
+    start, end = chunk.body_start, chunk.body_end
+    if chunk.cell_type == "code" and options is not None:
+        options = options.strip(" ,") or None
+        start_line = "```{{r {0}}}\n".format(options) if options else "```{r}\n"
+        start = chunk.start
+        text = start_line + text
+
+    body_start = chunk.body_start
+    with open(infile, "r+b") as f:
+        # an unclosed chunk header on the last line may have no newline, in
+        # which case one is needed before the body
+        if chunk.cell_type == "code" and start == body_start:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                text = "\n" + text
+                body_start += 1
+
+        data = text.encode(ENCODING)
+        f.seek(start)
+        tail = f.read()
+        old, tail = tail[:end - start], tail[end - start:]
+        f.seek(start)
+        f.write(data)
+        f.write(tail)
+        f.truncate()
+
+    # the header is the first pair of --- lines anywhere in the document, so
+    # adding or removing one before the header can change it
+    if index.header is None or index.header[1] > start:
+        old_lines = old.decode(ENCODING).splitlines()
+        if any(re_yaml_delim.match(l) for l in lines + old_lines):
+            index = build_index(infile)
+            index_cache[index.path] = index
+            return index
+
+    delta = len(data) - (end - start)
+    shift = lambda x: x + delta if x >= end else x
+
+    chunks = [Chunk(c.cell_type, *[shift(x) for x in c[1:5]], *c[5:])
+              for c in index.chunks]
+    # an empty body starts at the end of the replaced span, so don't shift it
+    chunks[n] = chunks[n]._replace(body_start=body_start)
+    if start == chunk.start and chunk.cell_type == "code":
+        label, _ = parse_chunk_options(options)
+        body_start = start + len(start_line.encode(ENCODING))
+        chunks[n] = chunks[n]._replace(body_start=body_start,
+                                       options=options, label=label)
+
+    header = index.header
+    if header is not None:
+        header = (shift(header[0]), shift(header[1]))
+
+    stat = os.stat(infile)
+    index = RmdIndex(index.path, stat.st_mtime_ns, stat.st_size, header,
+                     chunks, chunk_labels(chunks))
+    index_cache[index.path] = index
+    return index
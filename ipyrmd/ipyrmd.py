@@ -17,6 +17,10 @@ TODO:
 import nbformat
 import yaml
 import re
+import os
+import collections
+import concurrent.futures
+import itertools
 
 # cell.source can be either "source" or ["source", "source"]
 # notebook does not insert implicit newlines in the list case
@@ -89,11 +93,9 @@ def read_ipynb(infile, header=None):
     return node, header
 
 
-def ipynb_to_rmd(infile, outfile, header=None):
+def render_rmd(node, header=None):
     result = []
 
-    node, header = read_ipynb(infile, header)
-
     if header is not None:
         # yaml.dump generates "..." as a document end marker instead of the
         # "---" conventionally used by rmarkdown, so manually add that instead
@@ -117,19 +119,18 @@ def ipynb_to_rmd(infile, outfile, header=None):
 
             result.append(text)
 
-    with open(outfile, "w") as f:
-        # separate blocks with blank lines to ensure that code blocks stand
-        # alone as paragraphs
-        f.write(join_with_emptylines(result))
+    # separate blocks with blank lines to ensure that code blocks stand
+    # alone as paragraphs
+    return join_with_emptylines(result)
 
-    return True
+
+def ipynb_to_rmd(infile, outfile, header=None):
+    return ipynb_to_formats(infile, {"Rmd": outfile}, header)
 
 
-def ipynb_to_spin(infile, outfile, header=None):
+def render_spin(node, header=None):
     result = []
 
-    node, header = read_ipynb(infile, header)
-
     if header is not None:
         # yaml.dump generates "..." as a document end marker instead of the
         # "---" conventionally used by rmarkdown, so manually add that instead
@@ -149,11 +150,34 @@ def ipynb_to_spin(infile, outfile, header=None):
                 text = maybe_join(cell.source)
             result.append(text)
 
-    with open(outfile, "w") as f:
-        # separate blocks with blank lines to ensure that code blocks stand
-        # alone as paragraphs
-        # not strictly necessary in this case
-        f.write(join_with_emptylines(result))
+    # separate blocks with blank lines to ensure that code blocks stand
+    # alone as paragraphs
+    # not strictly necessary in this case
+    return join_with_emptylines(result)
+
+
+def ipynb_to_spin(infile, outfile, header=None):
+    return ipynb_to_formats(infile, {"R": outfile}, header)
+
+
+RENDERERS = {"Rmd": render_rmd, "R": render_spin}
+
+
+def ipynb_to_formats(infile, outfiles, header=None):
+    """
+    Convert a notebook to several formats at once, reading and parsing it
+    only once. outfiles maps each target format ("Rmd" or "R") to the
+    filename to write it to.
+    """
+    for fmt in outfiles:
+        if fmt not in RENDERERS:
+            raise ValueError('Unknown output format "{0}"'.format(fmt))
+
+    node, header = read_ipynb(infile, header)
+
+    for fmt, outfile in outfiles.items():
+        with open(outfile, "w") as f:
+            f.write(RENDERERS[fmt](node, header))
 
     return True
 
@@ -163,47 +187,50 @@ METADATA = dict(kernelspec=dict(display_name="R", language="R", name="ir"),
                                    mimetype="text/x-r-source",
                                    pygments_lexer="r"))
 
+# YAML front matter appears to be restricted to strictly ---\nYAML\n---
+re_yaml_delim = re.compile(r"^---\s*$")
 
-def rmd_to_ipynb(infile, outfile):
+# the behaviour of rmarkdown appears to be that a code block does not
+# have to have matching numbers of start and end `s - just >=3
+# and there can be any number of spaces before the {r, meta} block,
+# but "r" must be the first character of that block
+re_code_start = re.compile(r"^````*\s*{r(.*)}\s*$")
+re_code_end = re.compile(r"^````*\s*$")
+re_code_inline = re.compile(r"`r.+`")
+
+
+def make_cell(is_code, source, **meta):
+    NN = nbformat.NotebookNode
+    if is_code:
+        return NN(cell_type="code", execution_count=None, source=source,
+                  metadata=NN(collapsed=True, autoscroll=False, **meta),
+                  outputs=[])
+    else:
+        return NN(cell_type="markdown", metadata=NN(**meta), source=source)
+
+
+def read_rmd(infile):
     NN = nbformat.NotebookNode
     node = NN(nbformat=4, nbformat_minor=0, metadata=NN(**METADATA), cells=[])
 
     with open(infile) as f:
         rmdlines = f.readlines()
 
-    # YAML front matter appears to be restricted to strictly ---\nYAML\n---
-    re_yaml_delim = re.compile(r"^---\s*$")
     delim_lines = [i for i, l in enumerate(rmdlines) if re_yaml_delim.match(l)]
     if len(delim_lines) >= 2 and delim_lines[1] - delim_lines[0] > 1:
         yamltext = '\n'.join(rmdlines[delim_lines[0] + 1:delim_lines[1]])
         try:
-            header = yaml.load(yamltext)
+            header = yaml.safe_load(yamltext)
             node.metadata["Rmd_header"] = header
         except yaml.YAMLError as e:
             print("Error reading document metadata block: {0}".format(e))
             print("Trying to continue without header")
         rmdlines = rmdlines[:delim_lines[0]] + rmdlines[delim_lines[1] + 1:]
 
-    # the behaviour of rmarkdown appears to be that a code block does not
-    # have to have matching numbers of start and end `s - just >=3
-    # and there can be any number of spaces before the {r, meta} block,
-    # but "r" must be the first character of that block
-
-    re_code_start = re.compile(r"^````*\s*{r(.*)}\s*$")
-    re_code_end = re.compile(r"^````*\s*$")
-    re_code_inline = re.compile(r"`r.+`")
-
     MD, CODE = range(2)
 
     def add_cell(celltype, celldata, **meta):
-        if celltype == MD:
-            cell = NN(cell_type="markdown", metadata=NN(**meta),
-                      source=celldata)
-        else:
-            cell = NN(cell_type="code", execution_count=None, source=celldata,
-                      metadata=NN(collapsed=True, autoscroll=False, **meta),
-                      outputs=[])
-        node.cells.append(cell)
+        node.cells.append(make_cell(celltype == CODE, celldata, **meta))
 
     state = MD
     celldata = []
@@ -245,13 +272,18 @@ def rmd_to_ipynb(infile, outfile):
     if state == CODE or celldata:
         add_cell(state, celldata, **meta)
 
-    with open(outfile, "w") as f:
-        nbformat.write(node, outfile)
+    return node
+
+
+def rmd_to_ipynb(infile, outfile):
+    node = read_rmd(infile)
+
+    nbformat.write(node, outfile)
 
     return True
 
 
-def spin_to_ipynb(infile, outfile):
+def read_spin(infile):
     NN = nbformat.NotebookNode
     node = NN(nbformat=4, nbformat_minor=0, metadata=NN(**METADATA), cells=[])
 
@@ -268,7 +300,7 @@ def spin_to_ipynb(infile, outfile):
         yamltext = '\n'.join(lines[delim_lines[0] + 1:delim_lines[1]])
         yamltext = unprepend_lines(yamltext, "#' ")
         try:
-            header = yaml.load(yamltext)
+            header = yaml.safe_load(yamltext)
             node.metadata["Rmd_header"] = header
         except yaml.YAMLError as e:
             print("Error reading document metadata block: {0}".format(e))
@@ -278,14 +310,7 @@ def spin_to_ipynb(infile, outfile):
     MD, CODE = range(2)
 
     def add_cell(celltype, celldata, **meta):
-        if celltype == MD:
-            cell = NN(cell_type="markdown", metadata=NN(**meta),
-                      source=celldata)
-        else:
-            cell = NN(cell_type="code", execution_count=None, source=celldata,
-                      metadata=NN(collapsed=True, autoscroll=False, **meta),
-                      outputs=[])
-        node.cells.append(cell)
+        node.cells.append(make_cell(celltype == CODE, celldata, **meta))
 
     state = MD
     celldata = []
@@ -330,7 +355,149 @@ def spin_to_ipynb(infile, outfile):
     if any([c.strip() for c in celldata]):
         add_cell(state, celldata, **meta)
 
-    with open(outfile, "w") as f:
-        nbformat.write(node, outfile)
+    return node
+
+
+def spin_to_ipynb(infile, outfile):
+    node = read_spin(infile)
+
+    nbformat.write(node, outfile)
 
     return True
+
+
+def canonical_source(source, collapse=False):
+    """
+    Normalise cell source for comparison - trailing whitespace and leading
+    or trailing blank lines are not preserved by conversion. With collapse,
+    runs of blank lines are also reduced to one, for cells which may have
+    been merged with an empty neighbour.
+    """
+    lines = [l.rstrip() for l in maybe_join(source).split("\n")]
+    text = "\n".join(lines).strip("\n")
+    return re.sub(r"\n{3,}", "\n\n", text) if collapse else text
+
+
+def canonical_cells(node, fmt="Rmd"):
+    """
+    Yield (cell_type, chunk_options, source) for each cell of node as it
+    would survive a round trip through fmt ("Rmd" or "R"): empty markdown
+    is dropped and adjacent markdown cells run together, as do adjacent
+    code cells in spin format unless separated by a #+ line.
+    """
+    pending = None
+    # in spin format the #+ line of an empty code cell applies to the next
+    # code cell, unless markdown or another #+ line comes first
+    carried = None
+    for cell in node.cells:
+        if cell.cell_type not in ("markdown", "code"):
+            continue
+        # markdown cells, and code cells in spin format, run together with
+        # neighbouring empty cells, keeping their blank lines; Rmd code
+        # chunks keep their blank lines exactly
+        source = canonical_source(cell.source,
+                                  cell.cell_type == "markdown" or fmt == "R")
+        has_options = "Rmd_chunk_options" in cell.metadata
+        options = (cell.metadata.get("Rmd_chunk_options") or "").strip(" ,")
+
+        if cell.cell_type == "markdown":
+            carried = None
+        elif fmt == "R" and not has_options and carried is not None:
+            has_options, options = True, carried
+
+        if cell.cell_type == "markdown" or fmt == "R":
+            if not source.strip():
+                if cell.cell_type == "code" and has_options:
+                    carried = options
+                continue
+            carried = None
+            if pending is not None and pending[0] == cell.cell_type and \
+                    (cell.cell_type == "markdown" or not has_options):
+                pending = (pending[0], pending[1],
+                           join_with_emptylines([pending[2], source]))
+                continue
+
+        if pending is not None:
+            yield pending
+        pending = (cell.cell_type, options, source)
+
+    if pending is not None:
+        yield pending
+
+
+Mismatch = collections.namedtuple("Mismatch", ["index", "expected", "found"])
+
+
+def check_pair(ipynb_file, other_file, fmt=None):
+    """
+    Compare a notebook against its Rmd or R twin without converting
+    either to disk. Returns None if they are in sync, otherwise a Mismatch
+    for the header (index None) or the first differing cell, with the
+    canonical cell from each side (None if that side has run out of cells).
+    """
+    if fmt is None:
+        fmt = "R" if os.path.splitext(other_file)[1].lower() == ".r" else "Rmd"
+
+    node, header = read_ipynb(ipynb_file)
+    other = read_rmd(other_file) if fmt == "Rmd" else read_spin(other_file)
+
+    other_header = other.metadata.get("Rmd_header", None)
+    if header != other_header:
+        return Mismatch(None, header, other_header)
+
+    cells = itertools.zip_longest(canonical_cells(node, fmt),
+                                  canonical_cells(other, fmt))
+    for i, (expected, found) in enumerate(cells):
+        if expected != found:
+            return Mismatch(i, expected, found)
+
+    return None
+
+
+# returned by check_tree in place of a Mismatch for a pair which could not be
+# read or compared, eg a malformed notebook
+CheckError = collections.namedtuple("CheckError", ["message"])
+
+
+def try_check_pair(ipynb_file, other_file, fmt=None):
+    """
+    As check_pair, but return a CheckError instead of raising, so that one
+    bad pair doesn't abort a whole check_tree run.
+    """
+    try:
+        return check_pair(ipynb_file, other_file, fmt)
+    except Exception as e:
+        return CheckError("{0}: {1}".format(type(e).__name__, e))
+
+
+def find_pairs(root, fmt=None):
+    """
+    Yield (ipynb, twin) for each notebook under root which has a .Rmd or .R
+    file of the same name alongside it (only those of format fmt, if given).
+    """
+    twin_exts = {"Rmd": (".rmd",), "R": (".r",),
+                 None: (".rmd", ".r")}[fmt]
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != ".ipynb_checkpoints"]
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() != ".ipynb":
+                continue
+            for twin in sorted(filenames):
+                twin_stem, twin_ext = os.path.splitext(twin)
+                if twin_stem == stem and twin_ext.lower() in twin_exts:
+                    yield (os.path.join(dirpath, filename),
+                           os.path.join(dirpath, twin))
+
+
+def check_tree(root, jobs=None, fmt=None):
+    """
+    Run check_pair over every pair found under root (with twins of format
+    fmt, if given) using a pool of jobs worker processes. Returns a list of
+    (ipynb, twin, mismatch) in the order found, with mismatch None for pairs
+    which are in sync and a CheckError for pairs which could not be checked.
+    """
+    pairs = list(find_pairs(root, fmt))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(try_check_pair, *zip(*pairs)) if pairs else []
+        return [(a, b, r) for (a, b), r in zip(pairs, results)]
@@ -21,7 +21,7 @@ class IpynbTest(unittest.TestCase):
     metadata = None
     use_rmd = True
 
-    def setUp(self):
+    def make_orig(self):
         if self.metadata is None:
             metadata = self.default_metadata
         else:
@@ -33,19 +33,28 @@ class IpynbTest(unittest.TestCase):
             "cells": self.cells
         })
 
+    def write_orig(self, ipynb_name, rmd_name):
+        with open(ipynb_name, "w") as f:
+            nbformat.write(self.orig, f)
+
+        if self.use_rmd:
+            ipyrmd.ipynb_to_rmd(ipynb_name, rmd_name)
+        else:
+            ipyrmd.ipynb_to_spin(ipynb_name, rmd_name)
+
+    def setUp(self):
+        self.make_orig()
+
         with tempfile.TemporaryDirectory() as d:
             ipynb0_name = d + "/0"
             rmd_name = d + "/1"
             ipynb1_name = d + "/2"
 
-            with open(ipynb0_name, "w") as f:
-                nbformat.write(self.orig, f)
+            self.write_orig(ipynb0_name, rmd_name)
 
             if self.use_rmd:
-                ipyrmd.ipynb_to_rmd(ipynb0_name, rmd_name)
                 ipyrmd.rmd_to_ipynb(rmd_name, ipynb1_name)
             else:
-                ipyrmd.ipynb_to_spin(ipynb0_name, rmd_name)
                 ipyrmd.spin_to_ipynb(rmd_name, ipynb1_name)
 
             with open(rmd_name) as f:
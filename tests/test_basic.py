@@ -1,3 +1,7 @@
+import tempfile
+from unittest import mock
+import nbformat
+import ipyrmd
 from . import IpynbTest, RmdTest
 
 
@@ -49,19 +53,40 @@ class TestSpinBasic(TestRmdBasic):
     source = spin_basic
     use_rmd = False
 
+ipynb_basic = [
+    dict(cell_type="markdown", metadata={}, source="markdown-0-0\nmarkdown-0-1\n"),
+    dict(cell_type="code", execution_count=0, metadata={}, outputs=[], source="code-1"),
+    dict(cell_type="markdown", metadata={}, source=["markdown-2-0\n", "markdown-2-1\n", "\n"]),
+    dict(cell_type="code", execution_count=0, metadata={}, outputs=[], source=["code-3-0\ncode-3-1\n", "code-3-2"]),
+]
 class TestIpynbBasic(IpynbTest):
-    cells = [
-        dict(cell_type="markdown", metadata={}, source="markdown-0-0\nmarkdown-0-1\n"),
-        dict(cell_type="code", execution_count=0, metadata={}, outputs=[], source="code-1"),
-        dict(cell_type="markdown", metadata={}, source=["markdown-2-0\n", "markdown-2-1\n", "\n"]),
-        dict(cell_type="code", execution_count=0, metadata={}, outputs=[], source=["code-3-0\ncode-3-1\n", "code-3-2"]),
-    ]
+    cells = ipynb_basic
     def test_basic_rmd(self):
         self.assertEqual(self.rmd, rmd_basic)
 
     def test_basic_ipynb(self):
         self.assertEqual(len(self.roundtrip.cells), len(self.cells))
 
+    def test_formats(self):
+        with tempfile.TemporaryDirectory() as d:
+            ipynb_name = d + "/0"
+            with open(ipynb_name, "w") as f:
+                nbformat.write(self.orig, f)
+
+            with mock.patch("ipyrmd.ipyrmd.read_ipynb",
+                            wraps=ipyrmd.ipyrmd.read_ipynb) as read_ipynb:
+                ipyrmd.ipynb_to_formats(ipynb_name, {"Rmd": d + "/1", "R": d + "/2"})
+                self.assertEqual(read_ipynb.call_count, 1)
+            ipyrmd.ipynb_to_spin(ipynb_name, d + "/3")
+
+            with open(d + "/1") as f:
+                self.assertEqual(f.read(), rmd_basic)
+            with open(d + "/2") as f, open(d + "/3") as g:
+                self.assertEqual(f.read(), g.read())
+
+            with self.assertRaises(ValueError):
+                ipyrmd.ipynb_to_formats(ipynb_name, {"ipynb": d + "/4"})
+
 rmd_repeat = """markdown-0
 ```{r}
 code-1
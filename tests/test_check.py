@@ -0,0 +1,156 @@
+import os
+import tempfile
+import ipyrmd
+
+from . import IpynbTest
+from .test_basic import ipynb_basic
+
+# write a notebook and its converted twin to a tempdir, after which the twin
+# can be edited to check that drift is detected
+
+class CheckTest(IpynbTest):
+    cells = ipynb_basic
+
+    def setUp(self):
+        self.make_orig()
+        self.tempdir = tempfile.TemporaryDirectory()
+        d = self.tempdir.name
+        self.ipynb_name = os.path.join(d, "nb.ipynb")
+        self.other_name = os.path.join(d, "nb.Rmd" if self.use_rmd else "nb.R")
+        self.write_orig(self.ipynb_name, self.other_name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def edit_other(self, old, new):
+        with open(self.other_name) as f:
+            text = f.read()
+        with open(self.other_name, "w") as f:
+            f.write(text.replace(old, new))
+
+class TestCheckBasic(CheckTest):
+    def test_in_sync(self):
+        self.assertIsNone(ipyrmd.check_pair(self.ipynb_name, self.other_name))
+
+    def test_changed_cell(self):
+        self.edit_other("code-3-1", "code-3-x")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertEqual(mismatch.index, 3)
+        self.assertIn("code-3-1", mismatch.expected[2])
+        self.assertIn("code-3-x", mismatch.found[2])
+
+    def test_missing_cell(self):
+        self.edit_other("code-3-0\ncode-3-1\ncode-3-2", "")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertEqual(mismatch.index, 3)
+
+    def test_tree(self):
+        results = ipyrmd.check_tree(self.tempdir.name, jobs=1)
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][2])
+
+        self.edit_other("markdown-2-0", "markdown-2-x")
+        results = ipyrmd.check_tree(self.tempdir.name, jobs=1)
+        self.assertEqual(results[0][2].index, 2)
+
+    def test_tree_format(self):
+        fmt = "Rmd" if self.use_rmd else "R"
+        other = "R" if self.use_rmd else "Rmd"
+        self.assertEqual(len(ipyrmd.check_tree(self.tempdir.name, jobs=1, fmt=fmt)), 1)
+        self.assertEqual(ipyrmd.check_tree(self.tempdir.name, jobs=1, fmt=other), [])
+
+    def test_tree_error(self):
+        with open(os.path.join(self.tempdir.name, "bad.ipynb"), "w") as f:
+            f.write("<<<<<<< HEAD")
+        with open(os.path.join(self.tempdir.name, "bad.Rmd"), "w") as f:
+            f.write("text")
+        results = ipyrmd.check_tree(self.tempdir.name, jobs=1)
+        self.assertEqual([os.path.basename(r[0]) for r in results], ["bad.ipynb", "nb.ipynb"])
+        self.assertIsInstance(results[0][2], ipyrmd.CheckError)
+        self.assertIsNone(results[1][2])
+
+class TestSpinCheck(TestCheckBasic):
+    use_rmd = False
+
+class TestChunkOptionsCheck(TestCheckBasic):
+    cells = [
+        dict(cell_type="code", execution_count=0, outputs=[], source="code-0",
+             metadata={"Rmd_chunk_options": "foo=0"}),
+        dict(cell_type="code", execution_count=0, outputs=[], source="code-1", metadata={}),
+        dict(cell_type="markdown", metadata={}, source="markdown-2"),
+        dict(cell_type="markdown", metadata={}, source=""),
+        dict(cell_type="markdown", metadata={}, source="markdown-4"),
+        dict(cell_type="code", execution_count=0, outputs=[], source="code-3-1",
+             metadata={"Rmd_chunk_options": "bar=5"}),
+    ]
+
+    def test_changed_options(self):
+        self.edit_other("foo=0", "foo=1")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertEqual(mismatch.index, 0)
+        self.assertEqual(mismatch.found[1], "foo=1")
+
+    def test_changed_cell(self):
+        self.edit_other("code-3-1", "code-3-x")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertIsNotNone(mismatch)
+
+    def test_missing_cell(self):
+        self.edit_other("code-1", "")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertIsNotNone(mismatch)
+
+    def test_tree(self):
+        results = ipyrmd.check_tree(self.tempdir.name, jobs=1)
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0][2])
+
+class TestSpinChunkOptionsCheck(TestChunkOptionsCheck):
+    use_rmd = False
+
+class TestHeaderCheck(CheckTest):
+    metadata = dict(IpynbTest.default_metadata,
+                    Rmd_header={"title": "Test document"})
+
+    def test_header_in_sync(self):
+        self.assertIsNone(ipyrmd.check_pair(self.ipynb_name, self.other_name))
+
+    def test_missing_header(self):
+        self.edit_other("---\ntitle: Test document\n---", "")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertIsNone(mismatch.index)
+        self.assertEqual(mismatch.expected, {"title": "Test document"})
+        self.assertIsNone(mismatch.found)
+
+class TestEmptyCellsCheck(CheckTest):
+    cells = [
+        dict(cell_type="markdown", metadata={}, source="a"),
+        dict(cell_type="markdown", metadata={}, source=" "),
+        dict(cell_type="markdown", metadata={}, source="b"),
+        dict(cell_type="code", execution_count=0, outputs=[], source="x <- 1", metadata={}),
+        dict(cell_type="code", execution_count=0, outputs=[], source=" ", metadata={}),
+        dict(cell_type="code", execution_count=0, outputs=[], source="x <- 2", metadata={}),
+        dict(cell_type="code", execution_count=0, outputs=[], source="",
+             metadata={"Rmd_chunk_options": "setup"}),
+        dict(cell_type="code", execution_count=0, outputs=[], source="y <- 2", metadata={}),
+    ]
+
+    def test_in_sync(self):
+        self.assertIsNone(ipyrmd.check_pair(self.ipynb_name, self.other_name))
+
+class TestSpinEmptyCellsCheck(TestEmptyCellsCheck):
+    use_rmd = False
+
+class TestBlankLinesCheck(CheckTest):
+    cells = [
+        dict(cell_type="markdown", metadata={}, source="a\n\nb"),
+        dict(cell_type="code", execution_count=0, outputs=[], source="x\n\ny", metadata={}),
+    ]
+
+    def test_in_sync(self):
+        self.assertIsNone(ipyrmd.check_pair(self.ipynb_name, self.other_name))
+
+    def test_code_blank_lines(self):
+        self.edit_other("x\n\ny", "x\n\n\n\ny")
+        mismatch = ipyrmd.check_pair(self.ipynb_name, self.other_name)
+        self.assertEqual(mismatch.index, 1)
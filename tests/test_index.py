@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+import ipyrmd
+from ipyrmd import index
+
+from .test_basic import rmd_basic, rmd_repeat
+from .test_chunk import chunk_source
+
+# each test writes source to a tempfile, indexes it, and checks that the
+# cells read through the index match those from a full conversion
+
+class IndexTest(unittest.TestCase):
+    source = ""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.rmd_name = os.path.join(self.tempdir.name, "0.Rmd")
+        with open(self.rmd_name, "w") as f:
+            f.write(self.source)
+        self.index = ipyrmd.get_index(self.rmd_name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def assertIndexCurrent(self, new_index):
+        self.assertEqual(new_index, index.build_index(self.rmd_name))
+
+    def assertCellsMatch(self):
+        cells = ipyrmd.read_rmd(self.rmd_name).cells
+        self.assertEqual(len(self.index.chunks), len(cells))
+        for i, cell in enumerate(cells):
+            self.assertEqual(ipyrmd.extract_cell(self.rmd_name, i), cell)
+
+class TestIndexBasic(IndexTest):
+    source = rmd_basic
+
+    def test_cells(self):
+        self.assertCellsMatch()
+
+    def test_cache(self):
+        self.assertIs(ipyrmd.get_index(self.rmd_name), self.index)
+        with open(self.rmd_name, "a") as f:
+            f.write("\nmore markdown\n")
+        self.assertIsNot(ipyrmd.get_index(self.rmd_name), self.index)
+        with self.assertRaises(ValueError):
+            ipyrmd.extract_cell(self.rmd_name, 0, self.index)
+
+    def test_cachefile(self):
+        cachefile = os.path.join(self.tempdir.name, "0.Rmd.index")
+        index.index_cache.clear()
+        first = ipyrmd.get_index(self.rmd_name, cachefile)
+        index.index_cache.clear()
+        self.assertEqual(ipyrmd.get_index(self.rmd_name, cachefile), first)
+
+    def test_replace_code(self):
+        new_index = ipyrmd.replace_cell(self.rmd_name, 1, "code-1-0\ncode-1-1")
+        self.assertIndexCurrent(new_index)
+        self.assertCellsMatch()
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 1).source,
+                         ["code-1-0\n", "code-1-1"])
+        self.assertIn("code-3-2", ipyrmd.extract_cell(self.rmd_name, 3).source)
+
+    def test_replace_options(self):
+        new_index = ipyrmd.replace_cell(self.rmd_name, 3, "", options="fit-model, echo=FALSE")
+        self.assertIndexCurrent(new_index)
+        self.assertCellsMatch()
+        cell = ipyrmd.extract_cell(self.rmd_name, "fit-model")
+        self.assertEqual(cell.metadata.Rmd_chunk_options, "fit-model, echo=FALSE")
+        self.assertEqual(cell.source, [])
+
+    def test_replace_unicode_options(self):
+        new_index = ipyrmd.replace_cell(self.rmd_name, 1, "x", options="fig.cap='é'")
+        self.assertIndexCurrent(new_index)
+        self.assertCellsMatch()
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 3).source,
+                         ["code-3-0\n", "code-3-1\n", "code-3-2"])
+
+    def test_replace_yaml_delim(self):
+        new_index = ipyrmd.replace_cell(self.rmd_name, 1, "a\n---\nb\n---\nc")
+        self.assertIndexCurrent(new_index)
+        self.assertIsNotNone(new_index.header)
+        self.assertCellsMatch()
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 1).source, ["a\n", "c"])
+
+        # cells after the header are still adjusted in place, but the one
+        # containing it can't be replaced
+        new_index = ipyrmd.replace_cell(self.rmd_name, 3, "d")
+        self.assertIndexCurrent(new_index)
+        with self.assertRaises(ValueError):
+            ipyrmd.replace_cell(self.rmd_name, 1, "e")
+
+    def test_replace_markdown(self):
+        ipyrmd.replace_cell(self.rmd_name, 0, ["markdown-0-x\n", "\n"])
+        self.assertCellsMatch()
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 0).source,
+                         ["markdown-0-x\n", "\n"])
+        with self.assertRaises(ValueError):
+            ipyrmd.replace_cell(self.rmd_name, 2, "```{r}\nx\n```")
+
+class TestIndexRepeat(IndexTest):
+    source = rmd_repeat
+
+    def test_cells(self):
+        self.assertCellsMatch()
+
+class TestIndexChunkOptions(IndexTest):
+    source = chunk_source
+
+    def test_cells(self):
+        self.assertCellsMatch()
+
+    def test_options(self):
+        self.assertIsNone(self.index.chunks[0].options)
+        self.assertEqual(self.index.chunks[2].options,
+                         "eval=-(4:5), results='markup', tidy=TRUE")
+        self.assertEqual(self.index.labels, {"#nospaces": 4})
+
+class TestIndexLabels(IndexTest):
+    source = """```{r setup, include=FALSE}
+library(foo)
+```
+
+text
+
+```{r fit-model, fig.cap="a, b", eval=c(1, 2)}
+fit <- lm(y ~ x)
+```
+```{r label="summary"}
+summary(fit)
+```
+"""
+
+    def test_cells(self):
+        self.assertCellsMatch()
+
+    def test_labels(self):
+        self.assertEqual(self.index.labels,
+                         {"setup": 0, "fit-model": 2, "summary": 3})
+        cell = ipyrmd.extract_cell(self.rmd_name, "fit-model")
+        self.assertEqual(cell.source, ["fit <- lm(y ~ x)"])
+
+    def test_parse_options(self):
+        label, options = ipyrmd.parse_chunk_options(self.index.chunks[2].options)
+        self.assertEqual(label, "fit-model")
+        self.assertEqual(options, {"fig.cap": '"a, b"', "eval": "c(1, 2)"})
+
+class TestIndexHeader(IndexTest):
+    source = """---
+title: Test document
+---
+lorem ipsum
+```{r}
+1+1
+```
+"""
+
+    def test_header(self):
+        self.assertEqual(self.index.header, (0, len("---\ntitle: Test document\n---\n")))
+        self.assertEqual(len(self.index.chunks), 2)
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 0).source,
+                         ["lorem ipsum\n"])
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 1).source, ["1+1"])
+
+class TestIndexUnclosed(IndexTest):
+    source = "text\n```{r}"
+
+    def test_replace(self):
+        self.assertEqual([c.cell_type for c in self.index.chunks], ["markdown", "code"])
+        new_index = ipyrmd.replace_cell(self.rmd_name, 1, "x <- 1")
+        self.assertIndexCurrent(new_index)
+        self.assertCellsMatch()
+        self.assertEqual(ipyrmd.extract_cell(self.rmd_name, 1).source, ["x <- 1"])